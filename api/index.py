@@ -1 +1,3 @@
-from app.main import app
\ No newline at end of file
+from app.main import app
+
+__all__ = ["app"]
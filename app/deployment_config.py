@@ -4,20 +4,26 @@ Handles configuration differences between local, Vercel, and other deployments.
 """
 
 import os
+import shutil
+from functools import lru_cache
 from pathlib import Path
 from typing import Dict, Any
 
 
+# Environment checks are cached: none of them change during a process's lifetime
+@lru_cache(maxsize=1)
 def is_serverless_environment() -> bool:
     """Check if running in a serverless environment."""
     return bool(os.getenv("VERCEL_ENV") or os.getenv("AWS_LAMBDA_FUNCTION_NAME"))
 
 
+@lru_cache(maxsize=1)
 def is_vercel_environment() -> bool:
     """Check if running in Vercel."""
     return bool(os.getenv("VERCEL_ENV"))
 
 
+@lru_cache(maxsize=1)
 def get_temp_directory() -> str:
     """Get appropriate temp directory for the environment."""
     if is_serverless_environment():
@@ -27,6 +33,7 @@ def get_temp_directory() -> str:
         return os.getenv("TEMP_DIR", "./temp")
 
 
+@lru_cache(maxsize=1)
 def get_output_directory() -> str:
     """Get appropriate output directory for the environment."""
     if is_serverless_environment():
@@ -37,6 +44,7 @@ def get_output_directory() -> str:
         return os.getenv("OUTPUT_DIR", "./output")
 
 
+@lru_cache(maxsize=1)
 def get_deployment_config() -> Dict[str, Any]:
     """Get deployment-specific configuration."""
     base_config = {
@@ -63,8 +71,9 @@ def get_deployment_config() -> Dict[str, Any]:
     return base_config
 
 
+@lru_cache(maxsize=1)
 def ensure_directories():
-    """Ensure required directories exist."""
+    """Ensure required directories exist (once per process)."""
     config = get_deployment_config()
     
     # Create temp directory if it doesn't exist and we're not in serverless
@@ -78,6 +87,7 @@ def ensure_directories():
         output_dir.mkdir(parents=True, exist_ok=True)
 
 
+@lru_cache(maxsize=1)
 def get_ffmpeg_path() -> str:
     """Get ffmpeg path for the environment."""
     if is_vercel_environment():
@@ -99,6 +109,12 @@ def get_ffmpeg_path() -> str:
         return "ffmpeg"
 
 
+@lru_cache(maxsize=1)
+def is_ffmpeg_available() -> bool:
+    """Check if ffmpeg is available on PATH."""
+    return shutil.which("ffmpeg") is not None
+
+
 def handle_serverless_limitations(file_size: int) -> None:
     """Check if file size exceeds serverless limitations."""
     config = get_deployment_config()
@@ -6,46 +6,55 @@ Handles web interface for audio transcription service.
 from fastapi import FastAPI
 from fastapi.responses import HTMLResponse
 from fastapi.templating import Jinja2Templates
-from fastapi.staticfiles import StaticFiles
 from starlette.requests import Request
 import os
 from pathlib import Path
 
 from app.routers import transcription
 
-# Initialize FastAPI app
+# Initialize FastAPI app (API docs are disabled in production to skip OpenAPI schema building)
+IS_PRODUCTION = os.getenv("VERCEL_ENV") == "production"
+
 app = FastAPI(
     title="Audio Transcription Service",
     description="Transcribe audio files and YouTube videos using Google Gemini API",
-    version="1.0.0"
+    version="1.0.0",
+    openapi_url=None if IS_PRODUCTION else "/openapi.json",
+    docs_url=None if IS_PRODUCTION else "/docs",
+    redoc_url=None
 )
 
 # Setup Jinja2 templates with absolute path
 BASE_DIR = Path(__file__).resolve().parent.parent
-templates = Jinja2Templates(directory=str(BASE_DIR / "app" / "templates"))
+TEMPLATE_DIR = BASE_DIR / "app" / "templates"
+templates = Jinja2Templates(directory=str(TEMPLATE_DIR))
+
+# Parse index.html at startup so the first request hits Jinja's template cache
+try:
+    templates.get_template("index.html")
+except Exception:
+    # Errors are reported by read_root on request
+    pass
 
 # Include routers
 app.include_router(transcription.router, prefix="/api", tags=["transcription"])
 
-@app.get("/debug")
-async def debug_info():
-    """Debug information endpoint."""
-    import sys
-    import os
-    from pathlib import Path
-    
-    base_dir = Path(__file__).resolve().parent.parent
-    template_dir = base_dir / "app" / "templates"
-    
-    return {
-        "base_dir": str(base_dir),
-        "template_dir": str(template_dir),
-        "template_exists": template_dir.exists(),
-        "files_in_base": list(os.listdir(str(base_dir))) if base_dir.exists() else [],
-        "files_in_app": list(os.listdir(str(base_dir / "app"))) if (base_dir / "app").exists() else [],
-        "python_path": sys.path,
-        "current_dir": os.getcwd()
-    }
+# Debug endpoint is only registered when explicitly enabled
+if os.getenv("VERCEL_DEBUG") == "1":
+    @app.get("/debug")
+    async def debug_info():
+        """Debug information endpoint."""
+        import sys
+        
+        return {
+            "base_dir": str(BASE_DIR),
+            "template_dir": str(TEMPLATE_DIR),
+            "template_exists": TEMPLATE_DIR.exists(),
+            "files_in_base": list(os.listdir(str(BASE_DIR))) if BASE_DIR.exists() else [],
+            "files_in_app": list(os.listdir(str(BASE_DIR / "app"))) if (BASE_DIR / "app").exists() else [],
+            "python_path": sys.path,
+            "current_dir": os.getcwd()
+        }
 
 @app.get("/", response_class=HTMLResponse)
 async def read_root(request: Request):
@@ -57,7 +66,7 @@ async def read_root(request: Request):
         error_details = {
             "error": str(e),
             "traceback": traceback.format_exc(),
-            "template_dir": str(BASE_DIR / "app" / "templates"),
+            "template_dir": str(TEMPLATE_DIR),
             "base_dir": str(BASE_DIR)
         }
         return HTMLResponse(f"<h1>Template Error</h1><pre>{error_details}</pre>", status_code=500)
@@ -8,18 +8,21 @@ from fastapi.responses import JSONResponse
 import os
 import tempfile
 import logging
-from typing import Dict, Any, List
+from typing import Dict, Any, List, Mapping, Optional, Tuple
 import asyncio
+from functools import lru_cache
 from pathlib import Path
 import time
 from datetime import datetime
+from urllib.parse import urlparse
 
 # Import the existing transcriber modules
-from transcriber.audio import AudioProcessor, InputType
-from transcriber.gemini import GeminiClient
-from transcriber.config import TranscriptionResult, AudioSegment, load_config, ProcessingError
-from app.deployment_config import get_deployment_config, handle_serverless_limitations, ensure_directories
-import re
+# (AudioProcessor / GeminiClient pull in yt-dlp, pydub and the Gemini SDK, so they are imported inside handlers)
+from transcriber.config import TranscriptionResult, AudioSegment, InputType, load_config, ProcessingError
+from app.deployment_config import (
+    get_deployment_config, handle_serverless_limitations, ensure_directories,
+    is_ffmpeg_available, is_serverless_environment, get_temp_directory
+)
 
 # Setup logging
 logger = logging.getLogger(__name__)
@@ -27,14 +30,42 @@ logger = logging.getLogger(__name__)
 # Create router
 router = APIRouter()
 
-# Initialize components
-config = load_config()
-deployment_config = get_deployment_config()
-ensure_directories()  # Ensure required directories exist
+# Audio file extensions accepted for upload
+ALLOWED_EXTENSIONS = frozenset({'.mp3', '.wav', '.m4a', '.mp4', '.webm', '.ogg', '.flac'})
 
+# Read uploads in 1MB chunks instead of buffering the whole body
+UPLOAD_CHUNK_SIZE = 1 << 20
+
+# Prompt templates live at the project root
+_PROMPTS_DIR = Path(__file__).resolve().parent.parent.parent / "prompts"
+
+# Hosts accepted as YouTube URLs (same set as AudioProcessor._is_youtube_url)
+_YT_HOSTS = frozenset({"youtube.com", "www.youtube.com", "m.youtube.com", "youtu.be", "www.youtu.be"})
+
+# Characters that are not allowed in filenames
+_UNSAFE_FN_CHARS = str.maketrans({c: '_' for c in '<>:"/\\|?*'})
+
+# Lazily initialized components (deferred to the first request to keep cold starts cheap)
+@lru_cache(maxsize=1)
+def get_config() -> Mapping[str, Any]:
+    """Load transcriber configuration once per worker."""
+    return load_config()
+
+@lru_cache(maxsize=1)
+def get_deployment_config_cached() -> Dict[str, Any]:
+    """Load deployment configuration once per worker and ensure directories exist."""
+    ensure_directories()
+    return get_deployment_config()
+
+def get_audio_processor():
+    """Create an AudioProcessor for a single request (each owns its own temp directory)."""
+    from transcriber.audio import AudioProcessor
+    return AudioProcessor()
+
+@lru_cache(maxsize=None)
 def load_prompt(name: str) -> str:
-    """Load prompt from file."""
-    prompt_file = Path("prompts") / f"{name}.txt"
+    """Load prompt from file (cached per worker; prompt files don't change at runtime)."""
+    prompt_file = _PROMPTS_DIR / f"{name}.txt"
     if not prompt_file.exists():
         logger.warning(f"Prompt file not found: {prompt_file}")
         return ""
@@ -45,11 +76,11 @@ def load_prompt(name: str) -> str:
 def get_safe_youtube_filename(title: str, uploader: str = "") -> str:
     """Generate safe filename for YouTube videos."""
     # Replace invalid filename characters
-    safe_title = re.sub(r'[<>:"/\\|?*]', '_', title)
+    safe_title = title.translate(_UNSAFE_FN_CHARS)
     safe_title = safe_title.strip().replace(' ', '_')
     
     if uploader:
-        safe_uploader = re.sub(r'[<>:"/\\|?*]', '_', uploader)
+        safe_uploader = uploader.translate(_UNSAFE_FN_CHARS)
         safe_uploader = safe_uploader.strip().replace(' ', '_')
         # Truncate long titles
         if len(safe_title) > 50:
@@ -68,6 +99,7 @@ async def process_transcription(
     api_key_override: str = None
 ) -> TranscriptionResult:
     """Process audio segments and return transcription results."""
+    config = get_config()
     
     # Initialize Gemini client with API key priority: override > environment > config
     api_key = api_key_override or os.getenv("GEMINI_API_KEY") or config.get("gemini_api_key")
@@ -75,7 +107,12 @@ async def process_transcription(
     if not api_key:
         raise ProcessingError("Gemini API key not configured. Please set your API key.")
     
-    gemini_client = GeminiClient(api_key, config.get("gemini_model", "gemini-2.0-flash-exp"))
+    model = config.get("gemini_model", "gemini-2.0-flash-exp")
+    if api_key_override:
+        # User-supplied keys get a fresh client so no cached state is shared across keys
+        gemini_client = _new_gemini_client(api_key, model)
+    else:
+        gemini_client = _server_gemini_client(api_key, model)
     
     # Load prompts
     transcribe_prompt = load_prompt("transcribe")
@@ -85,46 +122,40 @@ async def process_transcription(
     # Track timing
     start_time = time.time()
     
-    # Calculate total audio duration
-    total_duration = sum(segment.end_time - segment.start_time for segment in audio_segments)
+    # Transcribe audio segments in parallel (gather preserves input order)
+    results = await asyncio.gather(
+        *[gemini_client.transcribe_audio(segment.file_path, transcribe_prompt) for segment in audio_segments],
+        return_exceptions=True
+    )
     
-    # Transcribe audio segments
-    if len(audio_segments) == 1:
-        # Single segment - process directly
-        segment_text = await gemini_client.transcribe_audio(
-            audio_segments[0].file_path,
-            transcribe_prompt
-        )
-        audio_segments[0].transcription = segment_text
-        raw_text = segment_text
-    else:
-        # Multiple segments - process in parallel
-        tasks = []
-        for i, segment in enumerate(audio_segments):
-            task = gemini_client.transcribe_audio(
-                segment.file_path,
-                transcribe_prompt
-            )
-            tasks.append((i, task))
-        
-        # Execute all tasks concurrently
-        results = await asyncio.gather(*[task for _, task in tasks])
-        
-        # Assign results to segments
-        for (i, _), text in zip(tasks, results):
-            audio_segments[i].transcription = text
-        
-        # Combine all transcriptions
-        raw_text = "\n\n".join(
-            segment.transcription for segment in audio_segments
-            if segment.transcription
-        )
+    # Single pass: total audio duration, segment transcriptions and combined text
+    total_duration = 0.0
+    texts = []
+    errors = []
+    for segment, text in zip(audio_segments, results):
+        total_duration += segment.end_time - segment.start_time
+        if isinstance(text, BaseException):
+            logger.warning(f"Segment {segment.segment_id} transcription failed: {text}")
+            segment.transcription = ""
+            errors.append(text)
+        else:
+            segment.transcription = text
+            if text:
+                texts.append(text)
     
-    # Format text
-    formatted_text = await gemini_client.format_text(raw_text, format_prompt)
+    # Keep completed segments unless every segment failed
+    if errors and len(errors) == len(results):
+        raise errors[0]
     
-    # Generate summary
-    summary_text = await gemini_client.summarize_text(formatted_text, summarize_prompt)
+    raw_text = "\n\n".join(texts)
+    
+    # Format text and generate summary in a single request (the API rejects empty text parts)
+    formatted_text = ""
+    summary_text = ""
+    if raw_text:
+        formatted_text, summary_text = await gemini_client.format_and_summarize(
+            raw_text, format_prompt, summarize_prompt
+        )
     
     # Calculate processing time
     processing_time = time.time() - start_time
@@ -160,40 +191,46 @@ async def transcribe_audio_file(
         Transcription results including raw, formatted, and summary text
     """
     temp_file_path = None
+    audio_processor = None
+    audio_segments = None
+    ensure_directories()
     
     try:
-        # Check file size for serverless limitations
-        content = await audio_file.read()
-        await audio_file.seek(0)  # Reset file pointer
-        
-        try:
-            handle_serverless_limitations(len(content))
-        except ValueError as e:
-            raise HTTPException(status_code=413, detail=str(e))
-        
         # Validate file type
-        allowed_extensions = {'.mp3', '.wav', '.m4a', '.mp4', '.webm', '.ogg', '.flac'}
-        file_ext = Path(audio_file.filename).suffix.lower()
+        filename = audio_file.filename or ""
+        dot = filename.rfind('.')
+        file_ext = filename[dot:].lower() if dot >= 0 else ""
+        base_filename = filename[:dot] if dot >= 0 else filename
         
-        if file_ext not in allowed_extensions:
+        if file_ext not in ALLOWED_EXTENSIONS:
             raise HTTPException(
                 status_code=400,
-                detail=f"Unsupported file type: {file_ext}. Allowed types: {', '.join(allowed_extensions)}"
+                detail=f"Unsupported file type: {file_ext}. Allowed types: {', '.join(sorted(ALLOWED_EXTENSIONS))}"
             )
         
-        # Save uploaded file to temporary location (use deployment config for temp dir)
+        # Stream uploaded file to temporary location in chunks (use deployment config for temp dir)
+        file_size = 0
         with tempfile.NamedTemporaryFile(
             delete=False, 
             suffix=file_ext, 
-            dir=deployment_config["temp_dir"]
+            dir=get_temp_directory()
         ) as temp_file:
             temp_file_path = temp_file.name
-            temp_file.write(content)
+            while chunk := await audio_file.read(UPLOAD_CHUNK_SIZE):
+                file_size += len(chunk)
+                
+                # Check file size for serverless limitations before reading further
+                try:
+                    handle_serverless_limitations(file_size)
+                except ValueError as e:
+                    raise HTTPException(status_code=413, detail=str(e))
+                
+                temp_file.write(chunk)
         
         logger.info(f"Processing uploaded file: {audio_file.filename}")
         
         # Create a new AudioProcessor instance for this request
-        audio_processor = AudioProcessor()
+        audio_processor = get_audio_processor()
         
         # Process the audio file
         audio_path, input_type = audio_processor.process_input(temp_file_path)
@@ -207,12 +244,8 @@ async def transcribe_audio_file(
             api_key_override
         )
         
-        # Clean up temporary audio segments and processor temp directory
-        background_tasks.add_task(cleanup_temp_files, audio_segments)
-        background_tasks.add_task(audio_processor.cleanup_temp_files)
-        
-        # Generate base filename (without extension)
-        base_filename = Path(audio_file.filename).stem
+        # Clean up the uploaded file, audio segments and processor temp directory in one task
+        background_tasks.add_task(cleanup_request_files, audio_segments, audio_processor, temp_file_path)
         
         return {
             "status": "success",
@@ -225,14 +258,17 @@ async def transcribe_audio_file(
             "base_filename": base_filename
         }
         
+    except HTTPException:
+        # Background tasks do not run when the handler raises: clean up synchronously
+        cleanup_request_files(audio_segments, audio_processor, temp_file_path)
+        # Re-raise HTTP exceptions as-is
+        raise
+        
     except Exception as e:
         logger.error(f"Error processing file upload: {str(e)}")
+        # Background tasks do not run when the handler raises: clean up synchronously
+        cleanup_request_files(audio_segments, audio_processor, temp_file_path)
         raise HTTPException(status_code=500, detail=str(e))
-        
-    finally:
-        # Clean up the uploaded file
-        if temp_file_path:
-            background_tasks.add_task(safe_cleanup_file, temp_file_path)
 
 @router.post("/transcribe/youtube")
 async def transcribe_youtube_url(
@@ -251,11 +287,10 @@ async def transcribe_youtube_url(
     """
     try:
         # Check system capabilities first
-        import shutil
-        ffmpeg_available = shutil.which("ffmpeg") is not None
+        ffmpeg_available = is_ffmpeg_available()
         
         # If in Vercel environment and ffmpeg is not available, provide alternative
-        if deployment_config.get("is_serverless") and not ffmpeg_available:
+        if is_serverless_environment() and not ffmpeg_available:
             logger.error("YouTube processing not available in current environment: ffmpeg not found")
             raise HTTPException(
                 status_code=422,
@@ -263,7 +298,7 @@ async def transcribe_youtube_url(
             )
         
         # Validate YouTube URL
-        if not any(domain in youtube_url for domain in ['youtube.com', 'youtu.be']):
+        if urlparse(youtube_url).netloc.lower() not in _YT_HOSTS:
             raise HTTPException(
                 status_code=400,
                 detail="Invalid YouTube URL. Please provide a valid YouTube video URL."
@@ -272,7 +307,7 @@ async def transcribe_youtube_url(
         logger.info(f"Processing YouTube URL: {youtube_url}")
         
         # Create a new AudioProcessor instance for this request
-        audio_processor = AudioProcessor()
+        audio_processor = get_audio_processor()
         
         try:
             # Process the YouTube URL
@@ -317,9 +352,8 @@ async def transcribe_youtube_url(
             api_key_override
         )
         
-        # Clean up temporary audio segments and processor temp directory
-        background_tasks.add_task(cleanup_temp_files, audio_segments)
-        background_tasks.add_task(audio_processor.cleanup_temp_files)
+        # Clean up temporary audio segments and processor temp directory in one task
+        background_tasks.add_task(cleanup_request_files, audio_segments, audio_processor)
         
         # Generate base filename for YouTube videos
         # Extract from audio_processor's stored info
@@ -357,53 +391,61 @@ def safe_cleanup_file(file_path: str):
     try:
         if file_path and os.path.exists(file_path):
             os.unlink(file_path)
-            logger.debug(f"Cleaned up file: {file_path}")
+            logger.debug("Cleaned up file: %s", file_path)
     except (OSError, FileNotFoundError):
         # File already deleted or doesn't exist - this is fine
-        logger.debug(f"File already cleaned up or doesn't exist: {file_path}")
+        logger.debug("File already cleaned up or doesn't exist: %s", file_path)
     except Exception as e:
-        logger.warning(f"Unexpected error cleaning up file {file_path}: {e}")
+        logger.warning("Unexpected error cleaning up file %s: %s", file_path, e)
 
 def cleanup_temp_files(audio_segments):
     """Clean up temporary audio segment files."""
     if not audio_segments:
         return
-        
+    
+    # Remove only the segment files; the AudioProcessor session directory is removed by
+    # AudioProcessor.cleanup_temp_files()
     for segment in audio_segments:
         try:
-            if hasattr(segment, 'file_path') and segment.file_path and os.path.exists(segment.file_path):
-                os.unlink(segment.file_path)
-                logger.debug(f"Cleaned up temporary file: {segment.file_path}")
-        except (OSError, FileNotFoundError) as e:
+            os.unlink(segment.file_path)
+            logger.debug("Cleaned up temporary file: %s", segment.file_path)
+        except FileNotFoundError:
             # File already deleted or doesn't exist - this is fine
-            logger.debug(f"File already cleaned up or doesn't exist: {segment.file_path}")
-        except Exception as e:
-            logger.warning(f"Unexpected error cleaning up file {segment.file_path}: {e}")
-    
-    # Also clean up the parent directory if it's empty
-    try:
-        if audio_segments and hasattr(audio_segments[0], 'file_path') and audio_segments[0].file_path:
-            parent_dir = os.path.dirname(audio_segments[0].file_path)
-            if parent_dir and os.path.exists(parent_dir):
-                # Check if directory is empty
-                if not os.listdir(parent_dir):
-                    os.rmdir(parent_dir)
-                    logger.debug(f"Cleaned up temporary directory: {parent_dir}")
-    except (OSError, FileNotFoundError):
-        # Directory already deleted - this is fine
-        logger.debug("Directory already cleaned up")
-    except Exception as e:
-        logger.warning(f"Unexpected error cleaning up directory: {e}")
+            logger.debug("File already cleaned up or doesn't exist: %s", segment.file_path)
+        except OSError as e:
+            logger.warning("Unexpected error cleaning up file %s: %s", segment.file_path, e)
+
+def cleanup_request_files(audio_segments, audio_processor=None, temp_file_path: str = None):
+    """Clean up all temporary files of a request (run as a single background task)."""
+    cleanup_temp_files(audio_segments)
+    if audio_processor is not None:
+        audio_processor.cleanup_temp_files()
+    if temp_file_path:
+        safe_cleanup_file(temp_file_path)
+
+def _new_gemini_client(api_key: str, model: str):
+    """Build a GeminiClient bound to the given API key."""
+    from transcriber.gemini import GeminiClient
+    return GeminiClient(api_key, model, get_config())
+
+@lru_cache(maxsize=1)
+def _server_gemini_client(api_key: str, model: str):
+    """Build (and reuse) the GeminiClient for the server's own API key within this worker."""
+    return _new_gemini_client(api_key, model)
+
+@lru_cache(maxsize=16)
+def _validator_model(api_key: str):
+    """Build (and reuse) a validation model bound to the given API key."""
+    from transcriber.gemini import bind_gemini_model
+    model, _ = bind_gemini_model(api_key, "gemini-2.0-flash-exp")
+    return model
 
 @router.post("/validate-api-key")
 async def validate_api_key(api_key: str = Form(...)):
     """Validate Gemini API key."""
     try:
-        from google.generativeai import configure, GenerativeModel
-        
         # Test the API key
-        configure(api_key=api_key)
-        model = GenerativeModel("gemini-2.0-flash-exp")
+        model = _validator_model(api_key)
         
         # Simple test prompt
         response = model.generate_content("Hello")
@@ -420,7 +462,7 @@ async def validate_api_key(api_key: str = Form(...)):
 @router.get("/check-api-key")
 async def check_api_key():
     """Check if API key is configured."""
-    api_key = config.get("gemini_api_key") or os.getenv("GEMINI_API_KEY")
+    api_key = get_config().get("gemini_api_key") or os.getenv("GEMINI_API_KEY")
     return {
         "configured": bool(api_key),
         "source": "environment" if api_key else "none"
@@ -429,7 +471,8 @@ async def check_api_key():
 @router.get("/health")
 async def health_check():
     """Health check endpoint for the transcription service."""
-    api_key = config.get("gemini_api_key") or os.getenv("GEMINI_API_KEY")
+    api_key = get_config().get("gemini_api_key") or os.getenv("GEMINI_API_KEY")
+    deployment_config = get_deployment_config_cached()
     return {
         "status": "healthy",
         "service": "transcription-router",
@@ -440,17 +483,17 @@ async def health_check():
         "temp_dir": deployment_config["temp_dir"]
     }
 
-@router.get("/debug/system")
-async def debug_system():
-    """Debug system capabilities for YouTube processing."""
-    import subprocess
-    import shutil
-    
-    # Check ffmpeg availability
-    ffmpeg_available = shutil.which("ffmpeg") is not None
-    ffmpeg_path = shutil.which("ffmpeg") if ffmpeg_available else "Not found"
+# Cached yt-dlp probe result: (timestamp, working, error)
+YTDLP_PROBE_TTL = 300  # seconds
+_ytdlp_probe_cache: Optional[Tuple[float, bool, str]] = None
+
+def _probe_yt_dlp() -> Tuple[bool, str]:
+    """Check yt-dlp against a real video, reusing the result for YTDLP_PROBE_TTL seconds."""
+    global _ytdlp_probe_cache
+    now = time.time()
+    if _ytdlp_probe_cache and now - _ytdlp_probe_cache[0] < YTDLP_PROBE_TTL:
+        return _ytdlp_probe_cache[1], _ytdlp_probe_cache[2]
     
-    # Check yt-dlp functionality
     yt_dlp_working = False
     yt_dlp_error = ""
     try:
@@ -468,6 +511,24 @@ async def debug_system():
     except Exception as e:
         yt_dlp_error = str(e)
     
+    _ytdlp_probe_cache = (now, yt_dlp_working, yt_dlp_error)
+    return yt_dlp_working, yt_dlp_error
+
+async def debug_system():
+    """Debug system capabilities for YouTube processing."""
+    import shutil
+    
+    deployment_config = get_deployment_config_cached()
+    
+    # Check ffmpeg availability
+    ffmpeg_path = shutil.which("ffmpeg")
+    ffmpeg_available = ffmpeg_path is not None
+    if not ffmpeg_available:
+        ffmpeg_path = "Not found"
+    
+    # Check yt-dlp functionality (network probe is cached)
+    yt_dlp_working, yt_dlp_error = _probe_yt_dlp()
+    
     return {
         "environment": {
             "is_vercel": os.getenv("VERCEL") == "1",
@@ -487,4 +548,8 @@ async def debug_system():
             "audio_file_processing": True,
             "recommended_approach": "audio_file_only" if not (yt_dlp_working and ffmpeg_available) else "full_support"
         }
-    }
\ No newline at end of file
+    }
+
+# Debug endpoint is only registered when explicitly enabled (same gate as /debug in app.main)
+if os.getenv("VERCEL_DEBUG") == "1":
+    router.get("/debug/system")(debug_system)
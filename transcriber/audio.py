@@ -1,18 +1,18 @@
 """音声処理（ファイル・YouTube）"""
 
 import os
+import re
 import logging
 import tempfile
 import shutil
+import subprocess
 import uuid
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache, partial
 from pathlib import Path
 from typing import List, Tuple
 from urllib.parse import urlparse
 
-import yt_dlp
-from pydub import AudioSegment as PyDubAudioSegment
-from pydub.silence import detect_silence
-
 from .config import (
     AudioSegment, 
     InputType, 
@@ -24,6 +24,87 @@ from .config import (
 
 logger = logging.getLogger(__name__)
 
+# 対応音声形式（str.endswith用のタプル）
+_SUPPORTED_SUFFIXES = ('.mp3', '.wav', '.m4a', '.aac', '.flac', '.ogg')
+
+# YouTubeのドメイン
+_YT_DOMAINS = frozenset({
+    'youtube.com', 'www.youtube.com', 'm.youtube.com',
+    'youtu.be', 'www.youtu.be'
+})
+_YT_URL_RE = re.compile(
+    r'^https?://(?:(?:www\.|m\.)?youtube\.com|(?:www\.)?youtu\.be)(?:[/?#]|$)', re.IGNORECASE
+)
+
+# ファイル名に使用できない文字と空白（連続は1つの_にまとめる）
+_UNSAFE_FN_RE = re.compile(r'[<>:"/\\|?*\s]+')
+
+# ffmpeg silencedetectの出力行
+_SILENCE_START_RE = re.compile(r'silence_start:\s*(-?[\d.]+)')
+_SILENCE_END_RE = re.compile(r'silence_end:\s*(-?[\d.]+)')
+
+
+def _detect_silence_ffmpeg(
+    audio_path: str, total_duration: int, noise_db: int = -35, min_duration: float = 3.0
+) -> List[Tuple[int, int]]:
+    """ffmpegのsilencedetectで無音区間を検出（ミリ秒の(開始, 終了)リスト）"""
+    cmd = [
+        'ffmpeg', '-nostdin', '-hide_banner', '-nostats', '-i', audio_path,
+        '-af', f'silencedetect=noise={noise_db}dB:d={min_duration}',
+        '-f', 'null', '-'
+    ]
+    # stderrは全体をバッファせず1行ずつ走査（長時間音声でもメモリ一定）
+    silence_ranges = []
+    silence_start = None
+    with subprocess.Popen(
+        cmd, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE, text=True, bufsize=1, errors='replace'
+    ) as proc:
+        for line in proc.stderr:
+            match = _SILENCE_START_RE.search(line)
+            if match:
+                silence_start = max(0, int(float(match.group(1)) * 1000))
+                continue
+            match = _SILENCE_END_RE.search(line)
+            if match and silence_start is not None:
+                silence_ranges.append((silence_start, int(float(match.group(1)) * 1000)))
+                silence_start = None
+    
+    if proc.returncode != 0:
+        raise subprocess.CalledProcessError(proc.returncode, cmd)
+    
+    # 末尾まで無音が続く場合はsilence_endが出力されない
+    if silence_start is not None:
+        silence_ranges.append((silence_start, total_duration))
+    
+    return silence_ranges
+
+
+@lru_cache(maxsize=1024)
+def _is_youtube_url_cached(url: str) -> bool:
+    """YouTube URL判定（同一URLの再判定はキャッシュから返す）"""
+    # 高速パス: 一般的な形式は正規表現のみで判定
+    if _YT_URL_RE.match(url):
+        return True
+    
+    try:
+        parsed = urlparse(url)
+        return parsed.netloc.lower() in _YT_DOMAINS
+    except Exception:
+        return False
+
+
+@lru_cache(maxsize=512)
+def _probe_duration_cached(audio_path: str, mtime_ns: int, size: int) -> float:
+    """ffprobeでメタデータから音声長を取得（mtime_ns/sizeはキャッシュ無効化用のキー）"""
+    # 音声長のみをスカラー値で出力させ、JSON解析を省略
+    cmd = [
+        'ffprobe', '-v', 'quiet', '-show_entries', 'format=duration',
+        '-of', 'csv=p=0', audio_path
+    ]
+    
+    result = subprocess.run(cmd, capture_output=True, timeout=10, check=True)
+    return float(result.stdout.strip())
+
 
 class AudioProcessor:
     """音声処理クラス"""
@@ -46,9 +127,6 @@ class AudioProcessor:
             
         self.is_vercel = self.config.get("is_vercel", False)
         
-        # 対応音声形式
-        self.supported_formats = {'.mp3', '.wav', '.m4a', '.aac', '.flac', '.ogg'}
-        
         # YouTube動画情報保存用
         self.youtube_info = None
         
@@ -62,6 +140,13 @@ class AudioProcessor:
             audio_path = self.download_youtube_audio(input_source)
             return audio_path, InputType.YOUTUBE
         
+        # 音声形式チェック（Pathを作る前に文字列で判定）
+        if not input_source.lower().endswith(_SUPPORTED_SUFFIXES):
+            raise InputValidationError(
+                f"対応していない音声形式です: {os.path.splitext(input_source)[1]}\n"
+                f"対応形式: {', '.join(_SUPPORTED_SUFFIXES)}"
+            )
+        
         # ローカルファイル判定
         file_path = Path(input_source)
         if not file_path.exists():
@@ -70,13 +155,6 @@ class AudioProcessor:
         if not file_path.is_file():
             raise InputValidationError(f"指定されたパスはファイルではありません: {input_source}")
         
-        # 音声形式チェック
-        if file_path.suffix.lower() not in self.supported_formats:
-            raise InputValidationError(
-                f"対応していない音声形式です: {file_path.suffix}\n"
-                f"対応形式: {', '.join(self.supported_formats)}"
-            )
-        
         logger.info("ローカルファイルとして処理")
         # 必要に応じて音声形式変換
         converted_path = self.convert_audio_format(str(file_path))
@@ -93,19 +171,12 @@ class AudioProcessor:
     
     def _is_youtube_url(self, url: str) -> bool:
         """YouTube URL判定"""
-        youtube_domains = [
-            'youtube.com', 'www.youtube.com', 'm.youtube.com',
-            'youtu.be', 'www.youtu.be'
-        ]
-        
-        try:
-            parsed = urlparse(url)
-            return parsed.netloc.lower() in youtube_domains
-        except Exception:
-            return False
+        return _is_youtube_url_cached(url)
     
     def download_youtube_audio(self, url: str) -> str:
         """YouTube音声ダウンロード"""
+        # 重い依存は使用時に読み込む（コールドスタート短縮）
+        import yt_dlp
         from rich.console import Console
         console = Console()
         
@@ -114,7 +185,7 @@ class AudioProcessor:
         
         try:
             # 一時ファイル名生成
-            temp_file = self.temp_dir / f"youtube_audio_{int(time.time())}"
+            temp_file = self.temp_dir / f"youtube_audio_{uuid.uuid4().hex[:12]}"
             
             # yt-dlp設定（ボット対策強化）
             ydl_opts = {
@@ -146,6 +217,15 @@ class AudioProcessor:
                 # より詳細な設定
                 'socket_timeout': 30,
                 'retries': 3,
+                # yt-dlp側でMP3（モノラル16kHz・VBR）に変換し、Python側での再変換を省略
+                'postprocessors': [{
+                    'key': 'FFmpegExtractAudio',
+                    'preferredcodec': 'mp3',
+                    'preferredquality': str(self.config["output_bitrate_quality"]),
+                }],
+                'postprocessor_args': {
+                    'extractaudio': ['-ac', '1', '-ar', '16000'],
+                },
             }
             
             with yt_dlp.YoutubeDL(ydl_opts) as ydl:
@@ -189,11 +269,11 @@ class AudioProcessor:
                 except yt_dlp.DownloadError as de:
                     raise ProcessingError(f"yt-dlpのダウンロードに失敗しました: {de}")
                 
-                # ダウンロードされたファイル名を特定（拡張子を広く許容）
+                # ダウンロードされたファイル名を特定（変換済みMP3を優先、拡張子を広く許容）
                 downloaded_file = None
                 # 優先度順に拡張子をチェック（音声コンテナ優先）
                 preferred_exts = [
-                    'm4a', 'webm', 'mp3', 'wav', 'mp4', 'aac', 'ogg', 'opus', 'mkv', 'ts'
+                    'mp3', 'm4a', 'webm', 'wav', 'mp4', 'aac', 'ogg', 'opus', 'mkv', 'ts'
                 ]
                 for ext in preferred_exts:
                     potential_file = temp_file.with_suffix(f'.{ext}')
@@ -215,14 +295,18 @@ class AudioProcessor:
                         f"ディレクトリ内のファイル: {existing}"
                     )
                 
-                # MP3に変換
                 console.print(f"[green]📦 ダウンロード済み:[/green] {downloaded_file.name}")
-                mp3_file = self.convert_audio_format(str(downloaded_file))
-                console.print(f"[green]🎧  変換後ファイル:[/green] {Path(mp3_file).name}")
                 
-                # 元ファイル削除
-                if downloaded_file.exists():
-                    downloaded_file.unlink()
+                # MP3以外の場合のみ変換（通常はyt-dlpが変換済み）
+                if downloaded_file.suffix.lower() == '.mp3':
+                    mp3_file = str(downloaded_file)
+                else:
+                    mp3_file = self.convert_audio_format(str(downloaded_file))
+                    console.print(f"[green]🎧  変換後ファイル:[/green] {Path(mp3_file).name}")
+                    
+                    # 元ファイル削除
+                    if downloaded_file.exists():
+                        downloaded_file.unlink()
                 
                 logger.info(f"YouTube音声ダウンロード完了: {mp3_file}")
                 return mp3_file
@@ -256,12 +340,18 @@ class AudioProcessor:
         logger.info(f"音声形式変換開始: {input_path} -> MP3")
         
         try:
+            from pydub import AudioSegment as PyDubAudioSegment
+            
             # 音声読み込み
             audio = PyDubAudioSegment.from_file(input_path)
             
-            # MP3として出力
+            # MP3として出力（音声認識用にモノラル16kHz・VBR）
             output_path = self.temp_dir / f"converted_{input_file.stem}.mp3"
-            audio.export(str(output_path), format="mp3")
+            audio.set_channels(1).set_frame_rate(16000).export(
+                str(output_path),
+                format="mp3",
+                parameters=['-q:a', str(self.config["output_bitrate_quality"])]
+            )
             
             logger.info(f"音声形式変換完了: {output_path}")
             return str(output_path)
@@ -293,22 +383,20 @@ class AudioProcessor:
             
             logger.info(f"長時間音声のため分割実行（上限: {max_duration}秒）")
             
+            total_duration_ms = int(duration * 1000)
+            
             # 高速化: 非常に長い音声（3倍以上）は無音検出をスキップ
             if duration > max_duration * 3:
                 logger.info("非常に長い音声のため固定時間分割を使用")
-                audio = PyDubAudioSegment.from_file(audio_path)
-                segments = self._split_by_time(audio, max_duration)
+                segments = self._split_by_time(audio_path, total_duration_ms, max_duration)
             else:
-                # 音声読み込み（必要な場合のみ）
-                audio = PyDubAudioSegment.from_file(audio_path)
-                
-                # 無音部分での分割を試行（高速パラメータ使用）
-                segments = self._split_by_silence_fast(audio, max_duration)
+                # 無音部分での分割を試行（ffmpegで検出、音声は読み込まない）
+                segments = self._split_by_silence_fast(audio_path, total_duration_ms, max_duration)
                 
                 # 無音部分での分割に失敗した場合は固定時間で分割
                 if not segments:
                     logger.info("無音分割に失敗、固定時間で分割")
-                    segments = self._split_by_time(audio, max_duration)
+                    segments = self._split_by_time(audio_path, total_duration_ms, max_duration)
             
             logger.info(f"音声分割完了: {len(segments)}セグメント")
             return segments
@@ -317,26 +405,21 @@ class AudioProcessor:
             logger.error(f"音声分割エラー: {e}")
             raise ProcessingError(f"音声分割に失敗しました: {e}")
     
-    def _split_by_silence_fast(self, audio: PyDubAudioSegment, max_duration: int) -> List[AudioSegment]:
-        """無音部分での分割（高速版）"""
+    def _split_by_silence_fast(self, audio_path: str, total_duration: int, max_duration: int) -> List[AudioSegment]:
+        """無音部分での分割（高速版、total_durationはミリ秒）"""
         logger.info("無音部分での分割を試行（高速モード）")
         
         try:
-            # 高速化: より大きな無音間隔と緩い閾値で検出
-            silence_ranges = detect_silence(
-                audio,
-                min_silence_len=3000,  # 3秒以上の無音（高速化）
-                silence_thresh=-35,    # -35dB以下を無音（緩い条件で高速化）
-                seek_step=1000         # 1秒ステップで検索（高速化）
-            )
+            # 高速化: ffmpegのsilencedetectで検出（3秒以上・-35dB以下を無音）
+            silence_ranges = _detect_silence_ffmpeg(audio_path, total_duration)
             
             if not silence_ranges:
                 logger.info("無音部分が見つかりません")
                 return []
             
-            segments = []
+            # 分割範囲を先に決定（ミリ秒）
+            ranges = []
             current_start = 0
-            segment_id = 0
             
             for silence_start, silence_end in silence_ranges:
                 # セグメント長チェック
@@ -344,90 +427,109 @@ class AudioProcessor:
                 
                 if segment_duration >= max_duration:
                     # 無音部分で分割
-                    segment_file = self._save_segment(
-                        audio, current_start, silence_start, segment_id
-                    )
-                    
-                    segments.append(AudioSegment(
-                        segment_id=segment_id,
-                        start_time=current_start / 1000.0,
-                        end_time=silence_start / 1000.0,
-                        file_path=segment_file
-                    ))
-                    
+                    ranges.append((current_start, silence_start))
                     current_start = silence_end
-                    segment_id += 1
             
             # 最後のセグメント
-            if current_start < len(audio):
-                segment_file = self._save_segment(
-                    audio, current_start, len(audio), segment_id
-                )
-                
-                segments.append(AudioSegment(
+            if current_start < total_duration:
+                ranges.append((current_start, total_duration))
+            
+            # セグメントを並列で書き出し
+            segment_files = self._save_segments(audio_path, ranges)
+            
+            return [
+                AudioSegment(
                     segment_id=segment_id,
-                    start_time=current_start / 1000.0,
-                    end_time=len(audio) / 1000.0,
+                    start_time=start_ms / 1000.0,
+                    end_time=end_ms / 1000.0,
                     file_path=segment_file
-                ))
-            
-            return segments
+                )
+                for segment_id, ((start_ms, end_ms), segment_file) in enumerate(zip(ranges, segment_files))
+            ]
             
         except Exception as e:
             logger.warning(f"無音分割に失敗: {e}")
             return []
     
-    def _split_by_time(self, audio: PyDubAudioSegment, max_duration: int) -> List[AudioSegment]:
-        """固定時間での分割"""
+    def _split_by_time(self, audio_path: str, total_duration: int, max_duration: int) -> List[AudioSegment]:
+        """固定時間での分割（total_durationはミリ秒）"""
         logger.info(f"固定時間での分割: {max_duration}秒間隔")
         
-        segments = []
         segment_duration_ms = max_duration * 1000
-        total_duration = len(audio)
+        segment_count = -(-total_duration // segment_duration_ms)  # 切り上げ
+        ranges = [
+            (i * segment_duration_ms, min((i + 1) * segment_duration_ms, total_duration))
+            for i in range(segment_count)
+        ]
         
-        for i, start_ms in enumerate(range(0, total_duration, segment_duration_ms)):
-            end_ms = min(start_ms + segment_duration_ms, total_duration)
-            
-            segment_file = self._save_segment(audio, start_ms, end_ms, i)
-            
-            segments.append(AudioSegment(
+        # セグメントを並列で書き出し
+        segment_files = self._save_segments(audio_path, ranges)
+        
+        return [
+            AudioSegment(
                 segment_id=i,
                 start_time=start_ms / 1000.0,
                 end_time=end_ms / 1000.0,
                 file_path=segment_file
-            ))
+            )
+            for i, ((start_ms, end_ms), segment_file) in enumerate(zip(ranges, segment_files))
+        ]
+    
+    def _save_segments(self, audio_path: str, ranges: List[Tuple[int, int]]) -> List[str]:
+        """複数セグメントを並列で保存（ffmpegは別プロセスで動くためスレッドで並列化できる）"""
+        if len(ranges) <= 1:
+            return [
+                self._save_segment(audio_path, start_ms, end_ms, i)
+                for i, (start_ms, end_ms) in enumerate(ranges)
+            ]
         
-        return segments
+        starts, ends = zip(*ranges)
+        max_workers = min(len(ranges), os.cpu_count() or 1)
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            return list(executor.map(
+                partial(self._save_segment, audio_path), starts, ends, range(len(ranges))
+            ))
     
-    def _save_segment(self, audio: PyDubAudioSegment, start_ms: int, end_ms: int, segment_id: int) -> str:
-        """セグメントをファイルに保存"""
-        segment = audio[start_ms:end_ms]
+    def _save_segment(self, audio_path: str, start_ms: int, end_ms: int, segment_id: int) -> str:
+        """セグメントをファイルに保存（ffmpegでストリームコピー、再エンコードなし）"""
         output_path = self.temp_dir / f"segment_{segment_id}.mp3"
-        segment.export(str(output_path), format="mp3")
+        base_cmd = [
+            'ffmpeg', '-nostdin', '-y', '-v', 'error',
+            '-ss', f"{start_ms / 1000.0:.3f}",
+            '-i', audio_path,
+            '-t', f"{(end_ms - start_ms) / 1000.0:.3f}",
+            '-vn',
+        ]
+        
+        try:
+            subprocess.run(base_cmd + ['-c', 'copy', str(output_path)], check=True, capture_output=True)
+        except subprocess.CalledProcessError as e:
+            # ストリームコピーできない形式の場合はMP3（モノラル16kHz・VBR）へ再エンコード
+            logger.debug(f"ストリームコピー失敗、再エンコードします: {e.stderr!r}")
+            subprocess.run(
+                base_cmd + [
+                    '-ac', '1', '-ar', '16000',
+                    '-c:a', 'libmp3lame', '-q:a', str(self.config["output_bitrate_quality"]),
+                    str(output_path)
+                ],
+                check=True, capture_output=True
+            )
+        
         return str(output_path)
     
     def _get_duration_fast(self, audio_path: str) -> float:
         """音声長を高速取得（メタデータベース）"""
         try:
-            # 高速化: ffprobeを使用してメタデータから取得
-            import subprocess
-            import json
-            
-            cmd = [
-                'ffprobe', '-v', 'quiet', '-print_format', 'json',
-                '-show_format', audio_path
-            ]
-            
-            result = subprocess.run(cmd, capture_output=True, text=True, timeout=10)
-            if result.returncode == 0:
-                info = json.loads(result.stdout)
-                duration = float(info['format']['duration'])
-                return duration
+            # 高速化: ffprobeの結果をパス・更新時刻・サイズ単位でキャッシュ
+            stat = os.stat(audio_path)
+            return _probe_duration_cached(audio_path, stat.st_mtime_ns, stat.st_size)
         except Exception:
             # ffprobeが失敗した場合はpydubで取得
             pass
             
         try:
+            from pydub import AudioSegment as PyDubAudioSegment
+            
             audio = PyDubAudioSegment.from_file(audio_path)
             return len(audio) / 1000.0
         except Exception as e:
@@ -447,14 +549,11 @@ class AudioProcessor:
             title = self.youtube_info.get('title', 'Unknown Title')
             uploader = self.youtube_info.get('uploader')
             
-            # ファイル名に使用できない文字を置換
-            import re
-            safe_title = re.sub(r'[<>:"/\\|?*]', '_', title)
-            safe_title = safe_title.strip().replace(' ', '_')
+            # ファイル名に使用できない文字・空白を1パスで置換（すべて置換されて空になる場合は既定名）
+            safe_title = _UNSAFE_FN_RE.sub('_', title).strip('_') or "audio_file"
+            safe_uploader = _UNSAFE_FN_RE.sub('_', uploader).strip('_') if uploader else ""
             
-            if uploader:
-                safe_uploader = re.sub(r'[<>:"/\\|?*]', '_', uploader)
-                safe_uploader = safe_uploader.strip().replace(' ', '_')
+            if safe_uploader:
                 # タイトルが長い場合は切り詰める
                 if len(safe_title) > 50:
                     safe_title = safe_title[:50]
@@ -477,7 +576,3 @@ class AudioProcessor:
                 logger.info(f"一時ファイル削除完了 (session: {self.session_id})")
         except Exception as e:
             logger.warning(f"一時ファイル削除エラー (session: {self.session_id}): {e}")
-
-
-# 必要なimportを追加
-import time
@@ -2,11 +2,14 @@
 
 import os
 import logging
+from concurrent.futures import ThreadPoolExecutor
 from dataclasses import dataclass
 from datetime import datetime
 from enum import Enum
+from functools import lru_cache
 from pathlib import Path
-from typing import Dict, Any
+from types import MappingProxyType
+from typing import Any, Mapping
 from dotenv import load_dotenv
 
 
@@ -61,8 +64,12 @@ class ProcessingError(TranscriberError):
     pass
 
 
-def load_config() -> Dict[str, Any]:
-    """環境変数から設定を読み込み"""
+@lru_cache(maxsize=1)
+def load_config() -> Mapping[str, Any]:
+    """環境変数から設定を読み込み（プロセス内で1回のみ、再読み込みはload_config.cache_clear()）
+    
+    キャッシュを共有するため読み取り専用のマッピングを返す
+    """
     load_dotenv()
     
     # Vercel環境の検出
@@ -72,16 +79,19 @@ def load_config() -> Dict[str, Any]:
     default_temp_dir = "/tmp" if is_vercel else "./temp"
     default_output_dir = "/tmp" if is_vercel else "./output"
     
-    return {
+    return MappingProxyType({
         "gemini_api_key": os.getenv("GEMINI_API_KEY"),
         "gemini_model": os.getenv("GEMINI_MODEL", "gemini-2.5-flash"),
         "max_audio_duration": int(os.getenv("MAX_AUDIO_DURATION", "1800")),
         "retry_count": int(os.getenv("RETRY_COUNT", "5")),
         "retry_delay": int(os.getenv("RETRY_DELAY", "1")),
+        "gemini_concurrency": max(1, int(os.getenv("GEMINI_CONCURRENCY", "4"))),  # Gemini APIの同時リクエスト数（最小1）
+        "use_uvloop": os.getenv("USE_UVLOOP", "0") == "1",  # uvloopでイベントループを高速化（Windows非対応）
+        "output_bitrate_quality": int(os.getenv("OUTPUT_BITRATE_QUALITY", "5")),  # MP3 VBR品質（0=高音質〜9=低音質）
         "output_dir": os.getenv("OUTPUT_DIR", default_output_dir),
         "temp_dir": os.getenv("TEMP_DIR", default_temp_dir),
         "is_vercel": is_vercel,
-    }
+    })
 
 
 def setup_logging(level: str = "INFO") -> None:
@@ -95,39 +105,31 @@ def setup_logging(level: str = "INFO") -> None:
     )
 
 
+@lru_cache(maxsize=16)
 def load_prompt(prompt_type: str) -> str:
-    """プロンプトテンプレート読み込み"""
+    """プロンプトテンプレート読み込み（プロセス内でキャッシュ、再読み込みはload_prompt.cache_clear()）"""
     prompt_path = Path("prompts") / f"{prompt_type}.txt"
     
-    if not prompt_path.exists():
+    # exists()でのstatを省略し、読み込み失敗で判定
+    try:
+        return prompt_path.read_bytes().decode("utf-8").strip()
+    except FileNotFoundError:
         raise FileNotFoundError(f"プロンプトファイルが見つかりません: {prompt_path}")
-    
-    return prompt_path.read_text(encoding="utf-8").strip()
 
 
-def save_results(result: TranscriptionResult, output_dir: str, filename: str = None) -> None:
-    """結果を3種類のファイルに保存"""
-    output_path = Path(output_dir)
-    output_path.mkdir(exist_ok=True)
-    
-    # ファイル名を決定
-    if filename:
-        # 明示的に指定されたファイル名を使用
-        input_name = filename
-    elif result.input_type == InputType.YOUTUBE:
-        # YouTube URLからファイル名を生成（旧形式、フォールバック用）
-        input_name = "youtube_video"
-    else:
-        # ファイルパスからファイル名を取得
-        input_name = Path(result.input_source).stem
-    
+def save_results(result: TranscriptionResult, output_dir_path: Path, stem: str) -> None:
+    """結果を3種類のファイルに保存（出力ディレクトリは呼び出し側で作成済みであること）"""
     # 3種類のファイルに保存
     files = {
-        f"{input_name}_raw.txt": result.raw_text,
-        f"{input_name}_formatted.txt": result.formatted_text,
-        f"{input_name}_summary.txt": result.summary_text,
+        f"{stem}_raw.txt": result.raw_text,
+        f"{stem}_formatted.txt": result.formatted_text,
+        f"{stem}_summary.txt": result.summary_text,
     }
     
-    for filename, content in files.items():
-        file_path = output_path / filename
-        file_path.write_text(content, encoding="utf-8")
\ No newline at end of file
+    # 3ファイルを並行して書き込み（エンコードは1回のみ）
+    def write_file(item):
+        name, content = item
+        (output_dir_path / name).write_bytes(content.encode("utf-8"))
+    
+    with ThreadPoolExecutor(max_workers=len(files)) as executor:
+        list(executor.map(write_file, files.items()))
\ No newline at end of file
@@ -1,19 +1,100 @@
 """Gemini API クライアント"""
 
 import asyncio
+import hashlib
+import json
 import logging
+import mimetypes
+import re
 import time
+from collections import OrderedDict
 from dataclasses import dataclass
-from typing import Optional, Callable, Any
+from typing import Optional, Callable, Any, Awaitable, Mapping, Tuple
 from pathlib import Path
 
-import google.generativeai as genai
-
 from .config import APIError, load_config
 
 
 logger = logging.getLogger(__name__)
 
+# リトライ対象のエラーパターン
+_RETRYABLE_ERROR_RE = re.compile(
+    "|".join(map(re.escape, [
+        "rate limit",
+        "quota exceeded",
+        "timeout",
+        "connection error",
+        "server error",
+        "503",
+        "502",
+        "500",
+    ])),
+    re.IGNORECASE
+)
+
+# 整形・要約を1リクエストで行う際の指示（JSONで両方を返させる）
+FORMAT_AND_SUMMARIZE_INSTRUCTION = (
+    "以下の「整形の指示」と「要約の指示」の両方に従ってテキストを処理し、"
+    '{"formatted": "整形済みテキスト", "summary": "要約"} の形式のJSONオブジェクトのみを出力してください。'
+    "要約は整形済みテキストの内容から作成してください。"
+)
+
+# モデルごとの1トークンあたり料金（USD）: (テキスト入力, 音声入力, 出力)
+_MODEL_RATES = {
+    # Gemini 2.5 Flash料金
+    "2.5-flash": (0.30e-6, 1.00e-6, 2.50e-6),
+    # Gemini 2.5 Pro料金（200k以下として計算、音声入力は計上しない）
+    "2.5-pro": (1.25e-6, 0.0, 10.00e-6),
+}
+
+# 料金表にないモデル
+_ZERO_RATES = (0.0, 0.0, 0.0)
+
+
+def _rates_for_model(model: str) -> Tuple[float, float, float]:
+    """モデル名から料金を取得"""
+    model = model.lower()
+    return next((rates for key, rates in _MODEL_RATES.items() if key in model), _ZERO_RATES)
+
+
+# 応答キャッシュの最大件数（同一クライアントを使い回すWebサーバーでのメモリ上限）
+RESPONSE_CACHE_SIZE = 128
+
+
+# ハッシュ計算時の読み込み単位
+DIGEST_CHUNK_SIZE = 1 << 16
+
+
+def _audio_digest(audio_path: str) -> str:
+    """音声ファイル内容のSHA-256（全体を読み込まず64KiBずつ計算）"""
+    h = hashlib.sha256()
+    with open(audio_path, "rb", buffering=0) as f:
+        for chunk in iter(lambda: f.read(DIGEST_CHUNK_SIZE), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+def _text_digest(text: str) -> str:
+    """テキストのSHA-256"""
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+def bind_gemini_model(api_key: str, model: str) -> Tuple[Any, Any]:
+    """APIキーに固定したGenerativeModelとファイルサービスクライアントを作成
+    
+    genai.configureはプロセス全体の設定で、GenerativeModelは最初のgenerate_content時点の設定で
+    通信クライアントを作る（google-generativeai 0.8.3の遅延生成される_clientに依存）。
+    configure直後にその場でクライアントを取得して固定する（awaitを挟まないので他リクエストの
+    configureと混ざらない）。SDKを更新する際はGenerativeModel._clientの扱いを確認すること。
+    """
+    import google.generativeai as genai
+    from google.generativeai import client as genai_client
+    
+    genai.configure(api_key=api_key)
+    generative_model = genai.GenerativeModel(model)
+    generative_model._client = genai_client.get_default_generative_client()
+    return generative_model, genai_client.get_default_file_client()
+
 
 @dataclass
 class TokenUsage:
@@ -26,21 +107,20 @@ class TokenUsage:
     def total_tokens(self) -> int:
         return self.input_tokens + self.output_tokens + self.audio_input_tokens
     
-    def calculate_cost(self, model: str) -> float:
-        """料金を計算（USD）"""
-        if "2.5-flash" in model.lower():
-            # Gemini 2.5 Flash料金
-            text_input_cost = (self.input_tokens / 1_000_000) * 0.30
-            audio_input_cost = (self.audio_input_tokens / 1_000_000) * 1.00
-            output_cost = (self.output_tokens / 1_000_000) * 2.50
-            return text_input_cost + audio_input_cost + output_cost
-        elif "2.5-pro" in model.lower():
-            # Gemini 2.5 Pro料金（200k以下として計算）
-            input_cost = (self.input_tokens / 1_000_000) * 1.25
-            output_cost = (self.output_tokens / 1_000_000) * 10.00
-            return input_cost + output_cost
-        else:
-            return 0.0
+    def calculate_cost(self, rates: Tuple[float, float, float]) -> float:
+        """料金を計算（USD、ratesは_rates_for_modelで取得した料金）"""
+        input_rate, audio_rate, output_rate = rates
+        return (
+            self.input_tokens * input_rate
+            + self.audio_input_tokens * audio_rate
+            + self.output_tokens * output_rate
+        )
+    
+    def iadd(self, other: "TokenUsage") -> None:
+        """使用量をその場で加算（新しいインスタンスを作らない）"""
+        self.input_tokens += other.input_tokens
+        self.output_tokens += other.output_tokens
+        self.audio_input_tokens += other.audio_input_tokens
     
     def __add__(self, other):
         return TokenUsage(
@@ -53,16 +133,37 @@ class TokenUsage:
 class GeminiClient:
     """Gemini API クライアント"""
     
-    def __init__(self, api_key: str, model: str):
-        """クライアント初期化"""
+    # 全リクエストの先頭に付ける固定の前置き（実行時の値を埋め込まないこと）
+    # 先頭部分をバイト単位で同一に保ち、サーバー側のプロンプトキャッシュを効かせる
+    _SYSTEM_PREAMBLE = (
+        "あなたは日本語の音声書き起こしとテキスト処理を行うアシスタントです。"
+        "指示に従い、指示された内容のみを出力してください。"
+    )
+    
+    def __init__(self, api_key: str, model: str, config: Optional[Mapping[str, Any]] = None):
+        """クライアント初期化（configを渡すと設定の再読み込みを省略）"""
         if not api_key:
             raise APIError("Gemini API キーが設定されていません")
         
-        genai.configure(api_key=api_key)
-        self.model = genai.GenerativeModel(model)
+        # SDKの読み込みは重いため、クライアント生成時まで遅延
+        import google.generativeai as genai
+        
+        self._genai = genai
+        self.model, self._file_client = bind_gemini_model(api_key, model)
         self.model_name = model
-        self.config = load_config()
+        self._rates = _rates_for_model(model)
+        self.config = config if config is not None else load_config()
+        self._retry_count = int(self.config["retry_count"])
+        self._retry_delay = int(self.config["retry_delay"])
+        # 各試行後の待機秒数（指数バックオフ）
+        self._backoffs = tuple(self._retry_delay * (1 << i) for i in range(self._retry_count))
+        # API呼び出しの同時実行数を制限（スレッドプールの飽和を防ぐ）
+        self._sem = asyncio.Semaphore(max(1, int(self.config.get("gemini_concurrency", 4))))
         self.total_usage = TokenUsage()
+        # 同一リクエストの重複実行を防ぐ応答キャッシュ（実行中はFutureを共有）
+        self._response_cache: "OrderedDict[Tuple[str, ...], asyncio.Future]" = OrderedDict()
+        # 用途ごとに直前に使用したプロンプト（変化の検出用）
+        self._last_prompts: dict = {}
         
         logger.info(f"Gemini クライアント初期化完了: {model}")
     
@@ -77,45 +178,67 @@ class GeminiClient:
                 raise APIError(f"音声ファイルが見つかりません: {audio_path}")
             if p.stat().st_size == 0:
                 raise APIError(f"音声ファイルが空です: {audio_path}")
-            # 音声ファイルをアップロード
-            audio_file = genai.upload_file(path=audio_path)
-            logger.debug(f"音声ファイルアップロード完了: {audio_file.name}")
-            
-            # プロンプトと音声でコンテンツ生成
-            response = await self._retry_with_backoff(
-                self._generate_content,
-                [prompt, audio_file]
-            )
             
-            # トークン使用量を記録
-            usage = self._extract_token_usage(response, is_audio=True)
-            self.total_usage += usage
+            # 同じ音声・プロンプトの書き起こしは1回だけ実行
+            key = ("transcribe", await asyncio.to_thread(_audio_digest, audio_path), _text_digest(prompt))
+            text = await self._deduplicate(key, lambda: self._transcribe_audio(audio_path, prompt))
             
             logger.info("音声書き起こし完了")
-            return response.text
+            return text
             
         except Exception as e:
             logger.error(f"音声書き起こしエラー: {e}")
             raise APIError(f"音声書き起こしに失敗しました: {e}")
     
+    async def _transcribe_audio(self, audio_path: str, prompt: str) -> str:
+        """音声書き起こし（APIを実際に呼び出す）"""
+        async with self._sem:
+            # 音声ファイルをアップロード
+            audio_file = await asyncio.to_thread(self._upload_file, audio_path)
+            logger.debug(f"音声ファイルアップロード完了: {audio_file.name}")
+            
+            try:
+                # プロンプトと音声でコンテンツ生成
+                self._check_prompt_stable("transcribe", prompt)
+                response = await self._retry_with_backoff(
+                    self._generate_content,
+                    [self._SYSTEM_PREAMBLE, prompt, audio_file]
+                )
+            finally:
+                # 書き起こし後はサーバー側のファイルを削除（保持期間まで残さない）
+                await asyncio.to_thread(self._delete_file, audio_file)
+        
+        # トークン使用量を記録
+        usage = self._extract_token_usage(response, is_audio=True)
+        self.total_usage.iadd(usage)
+        
+        return response.text
+    
+    def _upload_file(self, audio_path: str) -> Any:
+        """このクライアントのAPIキーで音声ファイルをアップロード（genai.upload_fileと同等）"""
+        path = Path(audio_path)
+        mime_type, _ = mimetypes.guess_type(path)
+        response = self._file_client.create_file(path=path, mime_type=mime_type, display_name=path.name)
+        return self._genai.types.File(response)
+    
+    def _delete_file(self, audio_file: Any) -> None:
+        """アップロード済みファイルをサーバーから削除（失敗しても処理は継続）"""
+        try:
+            self._file_client.delete_file(name=audio_file.name)
+            logger.debug(f"アップロード済みファイル削除: {audio_file.name}")
+        except Exception as e:
+            logger.warning(f"アップロード済みファイルの削除に失敗: {e}")
+    
     async def format_text(self, raw_text: str, prompt: str) -> str:
         """テキスト整形"""
         logger.info("テキスト整形開始")
         
         try:
-            full_prompt = f"{prompt}\n\n{raw_text}"
-            
-            response = await self._retry_with_backoff(
-                self._generate_content,
-                full_prompt
-            )
-            
-            # トークン使用量を記録
-            usage = self._extract_token_usage(response)
-            self.total_usage += usage
+            key = ("format", _text_digest(prompt), _text_digest(raw_text))
+            text = await self._deduplicate(key, lambda: self._generate_text("format", prompt, raw_text))
             
             logger.info("テキスト整形完了")
-            return response.text
+            return text
             
         except Exception as e:
             logger.error(f"テキスト整形エラー: {e}")
@@ -126,35 +249,120 @@ class GeminiClient:
         logger.info("テキスト要約開始")
         
         try:
-            full_prompt = f"{prompt}\n\n{text}"
+            key = ("summarize", _text_digest(prompt), _text_digest(text))
+            summary = await self._deduplicate(key, lambda: self._generate_text("summarize", prompt, text))
             
+            logger.info("テキスト要約完了")
+            return summary
+            
+        except Exception as e:
+            logger.error(f"テキスト要約エラー: {e}")
+            raise APIError(f"テキスト要約に失敗しました: {e}")
+    
+    async def format_and_summarize(self, raw_text: str, format_prompt: str, summarize_prompt: str) -> Tuple[str, str]:
+        """テキスト整形と要約を1回のリクエストで実行（整形済みテキスト, 要約）"""
+        logger.info("テキスト整形・要約開始")
+        
+        try:
+            key = (
+                "format_and_summarize",
+                _text_digest(format_prompt), _text_digest(summarize_prompt), _text_digest(raw_text)
+            )
+            try:
+                formatted_text, summary_text = await self._deduplicate(
+                    key, lambda: self._format_and_summarize(raw_text, format_prompt, summarize_prompt)
+                )
+            except ValueError as e:
+                # JSONとして解釈できない応答の場合は個別リクエストで実行
+                logger.warning(f"整形・要約の一括応答を解析できないため個別に実行します: {e}")
+                formatted_text = await self.format_text(raw_text, format_prompt)
+                summary_text = await self.summarize_text(formatted_text, summarize_prompt)
+            
+            logger.info("テキスト整形・要約完了")
+            return formatted_text, summary_text
+            
+        except Exception as e:
+            logger.error(f"テキスト整形・要約エラー: {e}")
+            raise APIError(f"テキスト整形・要約に失敗しました: {e}")
+    
+    async def _format_and_summarize(self, raw_text: str, format_prompt: str, summarize_prompt: str) -> Tuple[str, str]:
+        """テキスト整形と要約（APIを実際に呼び出す）"""
+        self._check_prompt_stable("format", format_prompt)
+        self._check_prompt_stable("summarize", summarize_prompt)
+        async with self._sem:
             response = await self._retry_with_backoff(
                 self._generate_content,
-                full_prompt
+                [
+                    self._SYSTEM_PREAMBLE,
+                    FORMAT_AND_SUMMARIZE_INSTRUCTION,
+                    f"# 整形の指示\n{format_prompt}",
+                    f"# 要約の指示\n{summarize_prompt}",
+                    raw_text,
+                ],
+                generation_config={"response_mime_type": "application/json"}
             )
+        
+        # トークン使用量を記録
+        usage = self._extract_token_usage(response)
+        self.total_usage.iadd(usage)
+        
+        # json.JSONDecodeErrorはValueErrorのサブクラス
+        result = json.loads(response.text)
+        if not isinstance(result, dict) or not all(isinstance(result.get(k), str) for k in ("formatted", "summary")):
+            raise ValueError("応答に formatted / summary が含まれていません")
+        
+        return result["formatted"], result["summary"]
+    
+    async def _generate_text(self, kind: str, prompt: str, text: str) -> str:
+        """プロンプト＋テキストでコンテンツ生成（APIを実際に呼び出す）"""
+        # 長いテキストを連結コピーせず、別パートとして送信
+        self._check_prompt_stable(kind, prompt)
+        async with self._sem:
+            response = await self._retry_with_backoff(
+                self._generate_content,
+                [self._SYSTEM_PREAMBLE, prompt, text]
+            )
+        
+        # トークン使用量を記録
+        usage = self._extract_token_usage(response)
+        self.total_usage.iadd(usage)
+        
+        return response.text
+    
+    async def _deduplicate(self, key: Tuple[str, ...], factory: Callable[[], Awaitable[Any]]) -> Any:
+        """同一キーの処理を共有（実行中なら完了を待ち、完了済みなら結果を返す）"""
+        future = self._response_cache.get(key)
+        if future is None:
+            future = asyncio.ensure_future(factory())
+            self._response_cache[key] = future
             
-            # トークン使用量を記録
-            usage = self._extract_token_usage(response)
-            self.total_usage += usage
+            # 失敗した結果はキャッシュしない
+            def discard_failed(done: asyncio.Future) -> None:
+                if done.cancelled() or done.exception() is not None:
+                    if self._response_cache.get(key) is done:
+                        del self._response_cache[key]
             
-            logger.info("テキスト要約完了")
-            return response.text
+            future.add_done_callback(discard_failed)
             
-        except Exception as e:
-            logger.error(f"テキスト要約エラー: {e}")
-            raise APIError(f"テキスト要約に失敗しました: {e}")
+            # 上限を超えたら古いものから破棄
+            while len(self._response_cache) > RESPONSE_CACHE_SIZE:
+                self._response_cache.popitem(last=False)
+        else:
+            self._response_cache.move_to_end(key)
+            logger.debug(f"応答キャッシュを使用: {key[0]}")
+        
+        # 待機側のキャンセルが共有中の処理に伝播しないよう保護
+        return await asyncio.shield(future)
     
-    async def _generate_content(self, content):
+    async def _generate_content(self, content, generation_config: Optional[dict] = None):
         """コンテンツ生成（同期関数を非同期で実行）"""
-        # 同期関数を非同期で実行
-        return await asyncio.get_event_loop().run_in_executor(
-            None, self.model.generate_content, content
+        return await asyncio.to_thread(
+            self.model.generate_content, content, generation_config=generation_config
         )
     
     async def _retry_with_backoff(self, func: Callable, *args, **kwargs) -> Any:
         """リトライ機能（指数バックオフ）"""
-        retry_count = self.config["retry_count"]
-        retry_delay = self.config["retry_delay"]
+        retry_count = self._retry_count
         
         for attempt in range(retry_count):
             try:
@@ -164,16 +372,16 @@ class GeminiClient:
                     return func(*args, **kwargs)
                     
             except Exception as e:
-                if attempt == retry_count - 1:
-                    # 最後の試行で失敗した場合は例外を再発生
+                # リトライ対象外のエラーは試行回数に関わらず即座に再発生
+                if not self._is_retryable_error(e):
                     raise e
                 
-                # リトライ対象のエラーかチェック
-                if not self._is_retryable_error(e):
+                if attempt == retry_count - 1:
+                    # 最後の試行で失敗した場合は例外を再発生
                     raise e
                 
                 # 指数バックオフで待機
-                wait_time = retry_delay * (2 ** attempt)
+                wait_time = self._backoffs[attempt]
                 logger.warning(f"APIエラー（試行 {attempt + 1}/{retry_count}）: {e}")
                 logger.info(f"{wait_time}秒後にリトライします...")
                 
@@ -181,53 +389,40 @@ class GeminiClient:
         
         raise APIError("リトライ回数を超過しました")
     
+    def _check_prompt_stable(self, kind: str, prompt: str) -> None:
+        """同じ用途のプロンプトが呼び出し間で変化していないか確認"""
+        last = self._last_prompts.get(kind)
+        if last is not None and last != prompt:
+            logger.warning(f"プロンプトが前回の呼び出しから変化しています（{kind}）。プロンプトキャッシュが効かなくなります")
+        self._last_prompts[kind] = prompt
+    
     def _is_retryable_error(self, error: Exception) -> bool:
         """リトライ可能なエラーかどうかを判定"""
-        error_str = str(error).lower()
-        
-        # リトライ対象のエラーパターン
-        retryable_patterns = [
-            "rate limit",
-            "quota exceeded",
-            "timeout",
-            "connection error",
-            "server error",
-            "503",
-            "502",
-            "500",
-        ]
-        
-        return any(pattern in error_str for pattern in retryable_patterns)
+        return _RETRYABLE_ERROR_RE.search(str(error)) is not None
     
     def _extract_token_usage(self, response, is_audio: bool = False) -> TokenUsage:
         """レスポンスからトークン使用量を抽出"""
         try:
-            if hasattr(response, 'usage_metadata'):
-                metadata = response.usage_metadata
-                
-                input_tokens = getattr(metadata, 'prompt_token_count', 0)
-                output_tokens = getattr(metadata, 'candidates_token_count', 0)
-                
-                if is_audio:
-                    # 音声入力の場合はaudio_input_tokensとして記録
-                    return TokenUsage(
-                        input_tokens=0,
-                        output_tokens=output_tokens,
-                        audio_input_tokens=input_tokens
-                    )
-                else:
-                    return TokenUsage(
-                        input_tokens=input_tokens,
-                        output_tokens=output_tokens,
-                        audio_input_tokens=0
-                    )
-            else:
-                logger.warning("レスポンスにusage_metadataが含まれていません")
-                return TokenUsage()
-                
-        except Exception as e:
-            logger.warning(f"トークン使用量の抽出に失敗: {e}")
+            metadata = response.usage_metadata
+            input_tokens = metadata.prompt_token_count
+            output_tokens = metadata.candidates_token_count
+        except AttributeError:
+            logger.warning("レスポンスにusage_metadataが含まれていません")
             return TokenUsage()
+        
+        if is_audio:
+            # 音声入力の場合はaudio_input_tokensとして記録
+            return TokenUsage(
+                input_tokens=0,
+                output_tokens=output_tokens,
+                audio_input_tokens=input_tokens
+            )
+        else:
+            return TokenUsage(
+                input_tokens=input_tokens,
+                output_tokens=output_tokens,
+                audio_input_tokens=0
+            )
     
     def get_total_usage(self) -> TokenUsage:
         """総トークン使用量を取得"""
@@ -235,7 +430,7 @@ class GeminiClient:
     
     def get_cost_summary(self) -> dict:
         """コスト情報のサマリーを取得"""
-        cost_usd = self.total_usage.calculate_cost(self.model_name)
+        cost_usd = self.total_usage.calculate_cost(self._rates)
         cost_jpy = cost_usd * 150  # 仮の為替レート（実際には動的に取得すべき）
         
         return {
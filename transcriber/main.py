@@ -2,12 +2,12 @@
 
 import asyncio
 import time
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
+from pathlib import Path
+from typing import Any, Mapping
 
 import click
-from rich.console import Console
-from rich.live import Live
-from rich.text import Text
 
 from .config import (
     load_config,
@@ -39,11 +39,17 @@ def transcribe(input_source: str, output_dir: str, format_only: bool,
         logging.disable(logging.CRITICAL)
     
     try:
+        from rich.console import Console
+        
         console = Console()
         
         # 設定読み込み
         config = load_config()
         
+        # 出力ディレクトリを作成（処理前に1回のみ）
+        output_dir_path = Path(output_dir)
+        output_dir_path.mkdir(parents=True, exist_ok=True)
+        
         # 非同期処理実行
         result, gemini_client, audio_processor = asyncio.run(process_transcription(
             input_source, 
@@ -53,8 +59,7 @@ def transcribe(input_source: str, output_dir: str, format_only: bool,
         ))
         
         # 結果保存（適切なファイル名を使用）
-        output_filename = audio_processor.get_safe_filename()
-        save_results(result, output_dir, output_filename)
+        save_results(result, output_dir_path, audio_processor.get_safe_filename())
         
         # コスト情報取得
         cost_info = gemini_client.get_cost_summary()
@@ -86,7 +91,7 @@ def transcribe(input_source: str, output_dir: str, format_only: bool,
 
 async def process_transcription(
     input_source: str, 
-    config: dict,
+    config: Mapping[str, Any],
     format_only: bool = False,
     summarize_only: bool = False
 ) -> TranscriptionResult:
@@ -94,60 +99,56 @@ async def process_transcription(
     start_time = time.time()
     
     try:
+        # スレッドプールをAPIの同時実行数に合わせる（スレッドの過剰生成を防ぐ）
+        asyncio.get_running_loop().set_default_executor(
+            ThreadPoolExecutor(max_workers=config["gemini_concurrency"])
+        )
+        
         # 初期化
         audio_processor = AudioProcessor()
-        gemini_client = GeminiClient(config["gemini_api_key"], config["gemini_model"])
+        gemini_client = GeminiClient(config["gemini_api_key"], config["gemini_model"], config)
         
-        # プロンプト読み込み
-        transcribe_prompt = load_prompt("transcribe")
-        format_prompt = load_prompt("format")
-        summarize_prompt = load_prompt("summarize")
+        # プロンプト読み込み（3ファイルを並行して読み込み）
+        transcribe_prompt, format_prompt, summarize_prompt = await asyncio.gather(
+            asyncio.to_thread(load_prompt, "transcribe"),
+            asyncio.to_thread(load_prompt, "format"),
+            asyncio.to_thread(load_prompt, "summarize"),
+        )
+        
+        # richの読み込みはスピナー表示時まで遅延（--help等の起動を軽くする）
+        from rich.console import Console
+        from rich.live import Live
+        from rich.spinner import Spinner
+        from rich.text import Text
         
         console = Console()
         
         async def run_with_spinner(step_num: int, total_steps: int, description: str, coroutine, complete_description: str):
-            """スピナー付きでコルーチンを実行"""
-            spinner_chars = ["⠋", "⠙", "⠹", "⠸", "⠼", "⠴", "⠦", "⠧", "⠇", "⠏"]
+            """スピナー付きでコルーチンを実行（描画はLiveの更新スレッドが担当）"""
             step_start = time.time()
+            spinner = Spinner("dots", style="bold cyan")
+            complete_text = None
             
-            # スピナーのテキストを作成
-            def create_spinner_text(char_index):
-                spinner = spinner_chars[char_index % len(spinner_chars)]
+            # 更新のたびに経過時間入りのスピナー（完了後は完了テキスト）を返す
+            def render():
+                if complete_text is not None:
+                    return complete_text
                 elapsed = time.time() - step_start
-                return Text(f"{spinner} ステップ {step_num}/{total_steps} {description} ({elapsed:.1f}秒)", style="bold cyan")
+                spinner.update(text=Text(f"ステップ {step_num}/{total_steps} {description} ({elapsed:.1f}秒)", style="bold cyan"))
+                return spinner
             
-            # Live表示でスピナーを回しながらコルーチンを実行
-            char_index = 0
-            with Live(create_spinner_text(char_index), console=console, refresh_per_second=10) as live:
-                # 非同期タスクとスピナー更新を並行実行
-                async def update_spinner():
-                    nonlocal char_index
-                    while True:
-                        await asyncio.sleep(0.1)
-                        char_index += 1
-                        live.update(create_spinner_text(char_index))
+            with Live(console=console, refresh_per_second=10, get_renderable=render) as live:
+                # メイン処理を実行
+                result = await coroutine
                 
-                # スピナータスクを開始
-                spinner_task = asyncio.create_task(update_spinner())
+                # 完了時に最終表示を更新
+                elapsed = time.time() - step_start
+                complete_text = Text(f"ステップ {step_num}/{total_steps} {complete_description} ({elapsed:.1f}秒)", style="bold cyan")
+                live.refresh()
                 
-                try:
-                    # メイン処理を実行
-                    result = await coroutine
-                    
-                    # 完了時に最終表示を更新
-                    elapsed = time.time() - step_start
-                    live.update(Text(f"ステップ {step_num}/{total_steps} {complete_description} ({elapsed:.1f}秒)", style="bold cyan"))
-                    
-                    return result
-                finally:
-                    # スピナーを停止
-                    spinner_task.cancel()
-                    try:
-                        await spinner_task
-                    except asyncio.CancelledError:
-                        pass
+                return result
         
-        total_steps = 5 if not format_only and not summarize_only else 3
+        total_steps = 4 if not format_only and not summarize_only else 3
         current_step = 0
         
         # Step 1: 入力処理・音声準備
@@ -169,7 +170,6 @@ async def process_transcription(
             )
         
         # ファイル情報を表示
-        from pathlib import Path
         if input_type.value == "file":
             filename = Path(input_source).name
             console.print(f"📄 ファイル: {filename}")
@@ -236,29 +236,25 @@ async def process_transcription(
         # 書き起こし結果統合
         raw_text = "\n\n".join(raw_texts) if raw_texts else ""
         
-        # Step 4: テキスト整形
+        # Step 4: テキスト整形・要約（1回のリクエストでまとめて実行）
         formatted_text = ""
+        summary_text = ""
         if not summarize_only and raw_text:
             current_step += 1
             
-            async def step4_process():
-                return await gemini_client.format_text(raw_text, format_prompt)
-            
-            formatted_text = await run_with_spinner(
-                current_step, total_steps, "📝 テキスト整形中...", step4_process(), "📝 テキスト整形完了"
+            formatted_text, summary_text = await run_with_spinner(
+                current_step, total_steps, "📝 テキスト整形・要約中...",
+                gemini_client.format_and_summarize(raw_text, format_prompt, summarize_prompt),
+                "📝 テキスト整形・要約完了"
             )
-        
-        # Step 5: テキスト要約
-        summary_text = ""
-        if raw_text:
+        elif raw_text:
+            # 要約のみ
             current_step += 1
             
-            async def step5_process():
-                source_text = formatted_text if formatted_text else raw_text
-                return await gemini_client.summarize_text(source_text, summarize_prompt)
-            
             summary_text = await run_with_spinner(
-                current_step, total_steps, "📋 テキスト要約中...", step5_process(), "📋 テキスト要約完了"
+                current_step, total_steps, "📋 テキスト要約中...",
+                gemini_client.summarize_text(raw_text, summarize_prompt),
+                "📋 テキスト要約完了"
             )
         
         # 一時ファイル削除
@@ -289,6 +285,14 @@ async def process_transcription(
 
 def main():
     """エントリーポイント"""
+    # 有効化されていればuvloopでイベントループを高速化（未インストールなら標準のまま）
+    if load_config()["use_uvloop"]:
+        try:
+            import uvloop
+            uvloop.install()
+        except ImportError:
+            pass
+    
     transcribe()
 
 